@@ -21,14 +21,33 @@ interface City {
   y: number;
 }
 
+// Strongest pheromone edges; v is base64-encoded float32 bytes on the wire
+interface PheromonePayload {
+  i: number[];
+  j: number[];
+  v: string;
+}
+
+interface PheromoneEdges {
+  i: number[];
+  j: number[];
+  v: Float32Array;
+}
+
 interface AlgorithmData {
   iteration: number;
   best_distance: number;
   avg_distance: number;
-  best_path: number[];
-  pheromones?: number[][];
+  // null when the best tour did not change this iteration
+  best_path: number[] | null;
+  pheromones?: PheromonePayload;
 }
 
+const decodePheromones = (payload: PheromonePayload): PheromoneEdges => {
+  const bytes = Uint8Array.from(atob(payload.v), (c) => c.charCodeAt(0));
+  return { i: payload.i, j: payload.j, v: new Float32Array(bytes.buffer) };
+};
+
 const Index = () => {
   const [isControlsOpen, setIsControlsOpen] = useState(true);
   const [cities, setCities] = useState<City[]>([]);
@@ -50,7 +69,7 @@ const Index = () => {
   const [currentIteration, setCurrentIteration] = useState<number>(0);
   const [avgDistance, setAvgDistance] = useState<number | null>(null);
   const [bestPath, setBestPath] = useState<number[]>([]);
-  const [pheromones, setPheromones] = useState<number[][] | null>(null);
+  const [pheromones, setPheromones] = useState<PheromoneEdges | null>(null);
 
   // Chart data
   const [convergenceData, setConvergenceData] = useState<number[]>([]);
@@ -97,9 +116,11 @@ const Index = () => {
       setCurrentIteration(data.iteration);
       setBestDistance(data.best_distance);
       setAvgDistance(data.avg_distance);
-      setBestPath(data.best_path);
+      if (data.best_path) {
+        setBestPath(data.best_path);
+      }
       if (data.pheromones) {
-        setPheromones(data.pheromones);
+        setPheromones(decodePheromones(data.pheromones));
       }
 
       setConvergenceData(prev => [...prev, data.best_distance]);
@@ -138,18 +159,18 @@ const Index = () => {
 
     // Draw pheromone trails
     if (pheromones && cities.length > 0) {
-      const maxPheromone = Math.max(...pheromones.flat());
-      for (let i = 0; i < cities.length; i++) {
-        for (let j = i + 1; j < cities.length; j++) {
-          const intensity = pheromones[i][j] / maxPheromone;
-          if (intensity > 0.1) {
-            ctx.strokeStyle = `rgba(59, 130, 246, ${intensity * 0.3})`;
-            ctx.lineWidth = intensity * 3;
-            ctx.beginPath();
-            ctx.moveTo(cities[i].x, cities[i].y);
-            ctx.lineTo(cities[j].x, cities[j].y);
-            ctx.stroke();
-          }
+      const maxPheromone = Math.max(...pheromones.v);
+      for (let e = 0; e < pheromones.v.length; e++) {
+        const i = pheromones.i[e];
+        const j = pheromones.j[e];
+        const intensity = pheromones.v[e] / maxPheromone;
+        if (intensity > 0.1) {
+          ctx.strokeStyle = `rgba(59, 130, 246, ${intensity * 0.3})`;
+          ctx.lineWidth = intensity * 3;
+          ctx.beginPath();
+          ctx.moveTo(cities[i].x, cities[i].y);
+          ctx.lineTo(cities[j].x, cities[j].y);
+          ctx.stroke();
         }
       }
     }
@@ -0,0 +1,437 @@
+"""
+Numba kernels for the ACO inner loop.
+
+Everything here works on plain NumPy arrays so a whole colony iteration
+(tour construction, 2-opt and tour lengths) runs without returning to the
+interpreter. Random numbers come from a small per-ant xorshift generator so
+ants can be built in parallel and still be reproducible from their seeds.
+"""
+
+import numba
+import numpy as np
+from numba import njit, prange
+
+
+def set_threads(n_jobs):
+    """
+    Set the Numba thread count for parallel kernels on the calling thread.
+
+    n_jobs <= 0 means all available threads. The count is always set, so a
+    previous n_jobs=1 solver cannot leave later default solvers serial.
+    """
+    limit = numba.config.NUMBA_NUM_THREADS
+    numba.set_num_threads(limit if n_jobs <= 0 else min(n_jobs, limit))
+
+
+@njit(cache=True)
+def _seed_state(seed):
+    """Scramble an integer seed into a non-zero xorshift state (splitmix64)."""
+    z = np.uint64(seed) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    if z == np.uint64(0):
+        z = np.uint64(0x2545F4914F6CDD1D)
+    return z
+
+
+@njit(cache=True)
+def _next_uniform(state):
+    """Advance an xorshift64* state; returns (new_state, uniform in [0, 1))."""
+    x = state
+    x ^= x >> np.uint64(12)
+    x ^= x << np.uint64(25)
+    x ^= x >> np.uint64(27)
+    out = (x * np.uint64(0x2545F4914F6CDD1D)) >> np.uint64(11)
+    return x, out * (1.0 / 9007199254740992.0)
+
+
+@njit(cache=True)
+def two_opt_nb(path: np.ndarray, dist: np.ndarray) -> np.ndarray:
+    """
+    First-improvement 2-opt on an int32 tour, modified in place.
+
+    Each candidate move is scored in O(1) from the four edges it touches
+    instead of re-measuring the whole tour. Don't-look bits skip cities
+    whose two tour edges were already checked against every other edge
+    without finding an improvement; a move clears the bits of its four
+    endpoints so only the neighbourhood it changed is searched again.
+    """
+    n = path.shape[0]
+    dont_look = np.zeros(n, dtype=np.bool_)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(n):
+            if dont_look[path[i]]:
+                continue
+            improved = False
+            # Try both edges incident to path[i]: (i-1, i) and (i, i+1)
+            for side in range(2):
+                e1 = (i - 1 + side) % n
+                for e2 in range(n):
+                    if e2 == e1 or e2 == (e1 + 1) % n or e1 == (e2 + 1) % n:
+                        continue
+                    lo = min(e1, e2)
+                    hi = max(e1, e2)
+                    a = path[lo]
+                    b = path[lo + 1]
+                    c = path[hi]
+                    d = path[(hi + 1) % n]
+                    # Accumulate in float64 so float32 rounding cannot cycle moves
+                    delta = (np.float64(dist[a, c]) + np.float64(dist[b, d])
+                             - np.float64(dist[a, b]) - np.float64(dist[c, d]))
+                    if delta < -1e-9:
+                        # Reverse path[lo+1:hi+1] with a two-pointer swap
+                        left, right = lo + 1, hi
+                        while left < right:
+                            tmp = path[left]
+                            path[left] = path[right]
+                            path[right] = tmp
+                            left += 1
+                            right -= 1
+                        dont_look[a] = False
+                        dont_look[b] = False
+                        dont_look[c] = False
+                        dont_look[d] = False
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved:
+                changed = True
+            else:
+                dont_look[path[i]] = True
+    return path
+
+
+@njit(cache=True)
+def _reverse(path, pos, lo, hi):
+    """Reverse path[lo:hi+1] in place, keeping pos (city -> index) in sync."""
+    while lo < hi:
+        a = path[lo]
+        b = path[hi]
+        path[lo] = b
+        path[hi] = a
+        pos[b] = lo
+        pos[a] = hi
+        lo += 1
+        hi -= 1
+
+
+@njit(cache=True)
+def two_opt_cl(path: np.ndarray, dist: np.ndarray, cand: np.ndarray) -> np.ndarray:
+    """
+    First-improvement 2-opt restricted to candidate lists, modified in place.
+
+    A move adding edge (a, c) is only tried for c in cand[a], which must be
+    sorted closest first: once dist[a, c] reaches the length of the tour
+    edge being removed at a no later candidate can give a gain, so the scan
+    stops there. Together with don't-look bits this makes a pass O(n * k)
+    instead of O(n^2).
+    """
+    n = path.shape[0]
+    pos = np.empty(n, dtype=np.int32)
+    for k in range(n):
+        pos[path[k]] = k
+    dont_look = np.zeros(n, dtype=np.bool_)
+    changed = True
+    while changed:
+        changed = False
+        for a in range(n):
+            if dont_look[a]:
+                continue
+            improved = False
+            for side in range(2):
+                i = pos[a]
+                # side 0 removes (a, succ a), side 1 removes (pred a, a)
+                b = path[(i + 1) % n] if side == 0 else path[(i - 1 + n) % n]
+                d_ab = np.float64(dist[a, b])
+                for k in range(cand.shape[1]):
+                    c = cand[a, k]
+                    d_ac = np.float64(dist[a, c])
+                    if d_ac >= d_ab:
+                        break
+                    j = pos[c]
+                    d = path[(j + 1) % n] if side == 0 else path[(j - 1 + n) % n]
+                    if c == b or d == a:
+                        continue
+                    delta = d_ac + np.float64(dist[b, d]) - d_ab - np.float64(dist[c, d])
+                    if delta < -1e-9:
+                        if side == 0:
+                            # ... a b ... c d ... -> ... a c ... b d ...
+                            if i < j:
+                                _reverse(path, pos, i + 1, j)
+                            else:
+                                _reverse(path, pos, j + 1, i)
+                        else:
+                            # ... b a ... d c ... -> ... b d ... a c ...
+                            if i < j:
+                                _reverse(path, pos, i, j - 1)
+                            else:
+                                _reverse(path, pos, j, i - 1)
+                        dont_look[a] = False
+                        dont_look[b] = False
+                        dont_look[c] = False
+                        dont_look[d] = False
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved:
+                changed = True
+            else:
+                dont_look[a] = True
+    return path
+
+
+@njit(cache=True)
+def tour_length(path: np.ndarray, dist: np.ndarray) -> float:
+    """Length of the closed tour through path."""
+    n = path.shape[0]
+    total = 0.0
+    for k in range(n):
+        total += dist[path[k], path[(k + 1) % n]]
+    return total
+
+
+@njit(cache=True)
+def _roulette(row, cands, visited, u, cum):
+    """
+    City drawn from the unvisited entries of cands in proportion to row[city].
+
+    Inverse-CDF sampling: one cumulative pass into the scratch buffer cum,
+    then a binary search. side='right' never lands on a zero-weight city.
+    Returns -1 when no unvisited candidate has positive weight.
+    """
+    m = cands.shape[0]
+    acc = 0.0
+    last = -1
+    for k in range(m):
+        c = cands[k]
+        if not visited[c] and row[c] > 0.0:
+            acc += row[c]
+            last = k
+        cum[k] = acc
+    if last < 0:
+        return -1
+    pos = np.searchsorted(cum[:m], u * acc, side='right')
+    return cands[min(pos, last)]
+
+
+@njit(cache=True)
+def _best_candidate(row, cands, visited):
+    """Unvisited entry of cands with the largest row[city]; -1 if all are visited."""
+    best = -1
+    for k in range(cands.shape[0]):
+        c = cands[k]
+        if not visited[c] and (best < 0 or row[c] > row[best]):
+            best = c
+    return best
+
+
+@njit(cache=True)
+def _best_unvisited(row, unvisited, remaining):
+    """Fallback once the candidate list is exhausted: best city left in the roster."""
+    best = unvisited[0]
+    for k in range(1, remaining):
+        if row[unvisited[k]] > row[best]:
+            best = unvisited[k]
+    return best
+
+
+@njit(cache=True)
+def _visit(city, unvisited, where, visited, remaining):
+    """Swap city past the end of the live roster unvisited[:remaining]; returns the new size."""
+    remaining -= 1
+    pos = where[city]
+    moved = unvisited[remaining]
+    unvisited[pos] = moved
+    where[moved] = pos
+    unvisited[remaining] = city
+    where[city] = remaining
+    visited[city] = True
+    return remaining
+
+
+@njit(cache=True)
+def _construct_tour(choice_info, cand, path, state):
+    """
+    Random-proportional tour over choice_info written into path.
+
+    Each step only samples among the unvisited cities of the current
+    city's candidate list cand[current]; when all of them are visited it
+    takes the best remaining city. Returns the RNG state.
+    """
+    n = path.shape[0]
+    unvisited = np.arange(n).astype(np.int32)
+    where = np.arange(n).astype(np.int32)
+    visited = np.zeros(n, dtype=np.bool_)
+    cum = np.empty(cand.shape[1])
+
+    state, u = _next_uniform(state)
+    city = min(int(u * n), n - 1)
+    remaining = n
+    for step in range(n):
+        path[step] = city
+        remaining = _visit(city, unvisited, where, visited, remaining)
+        if remaining == 0:
+            break
+        row = choice_info[city]
+        state, u = _next_uniform(state)
+        city = _roulette(row, cand[city], visited, u, cum)
+        if city < 0:
+            city = _best_unvisited(row, unvisited, remaining)
+    return state
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def construct_colony(choice_info, distances, cand, seeds, do_2opt, paths, dists):
+    """
+    Build one tour per seed in parallel into caller-owned buffers.
+
+    paths (n_ants, n_cities) int32 and dists (n_ants,) are overwritten, so
+    a solver can reuse the same storage every iteration.
+    """
+    for ant in prange(seeds.shape[0]):
+        state = _seed_state(seeds[ant])
+        _construct_tour(choice_info, cand, paths[ant], state)
+        if do_2opt:
+            two_opt_nb(paths[ant], distances)
+        dists[ant] = tour_length(paths[ant], distances)
+
+
+def run_iteration(choice_info, distances, cand, seeds, do_2opt):
+    """
+    Build one tour per seed in parallel (AS/MMAS/RANK construction).
+
+    Returns (paths, dists) with paths of shape (n_ants, n_cities).
+    Deliberately plain Python: a cached njit caller of the cached parallel
+    kernel can load a stale parfor entry point from disk and crash.
+    """
+    n_ants = seeds.shape[0]
+    n = choice_info.shape[0]
+    paths = np.empty((n_ants, n), dtype=np.int32)
+    dists = np.empty(n_ants)
+    construct_colony(choice_info, distances, cand, seeds, do_2opt, paths, dists)
+    return paths, dists
+
+
+@njit(cache=True)
+def run_iteration_acs(pheromones, choice_info, eta_beta, distances, cand, alpha,
+                      rho, tau0, q0, n_ants, seed, do_2opt):
+    """
+    Build n_ants ACS tours one after another.
+
+    Applies the pseudo-random proportional rule over each city's candidate
+    list and the local pheromone update after every step, so pheromones
+    and choice_info are modified in place and each ant sees the trails
+    left by the previous ones.
+    """
+    n = choice_info.shape[0]
+    paths = np.empty((n_ants, n), dtype=np.int32)
+    dists = np.empty(n_ants)
+    unvisited = np.empty(n, dtype=np.int32)
+    where = np.empty(n, dtype=np.int32)
+    visited = np.empty(n, dtype=np.bool_)
+    cum = np.empty(cand.shape[1])
+    state = _seed_state(seed)
+
+    for ant in range(n_ants):
+        path = paths[ant]
+        for k in range(n):
+            unvisited[k] = k
+            where[k] = k
+            visited[k] = False
+
+        state, u = _next_uniform(state)
+        city = min(int(u * n), n - 1)
+        remaining = n
+        for step in range(n):
+            path[step] = city
+            remaining = _visit(city, unvisited, where, visited, remaining)
+            if step > 0:
+                i = path[step - 1]
+                j = city
+                # Local pheromone update on the edge just traversed
+                tau = (1.0 - rho) * pheromones[i, j] + rho * tau0
+                pheromones[i, j] = tau
+                pheromones[j, i] = tau
+                choice_info[i, j] = tau ** alpha * eta_beta[i, j]
+                choice_info[j, i] = choice_info[i, j]
+            if remaining == 0:
+                break
+
+            row = choice_info[city]
+            state, u = _next_uniform(state)
+            if u < q0:
+                # Exploitation: best unvisited candidate
+                city = _best_candidate(row, cand[city], visited)
+            else:
+                state, u = _next_uniform(state)
+                city = _roulette(row, cand[city], visited, u, cum)
+            if city < 0:
+                city = _best_unvisited(row, unvisited, remaining)
+
+        if do_2opt:
+            two_opt_nb(path, distances)
+        dists[ant] = tour_length(path, distances)
+    return paths, dists
+
+
+@njit(parallel=True, cache=True)
+def update_pheromones(pheromones, paths, amounts, decay, lo, hi):
+    """
+    Evaporate, deposit and clip the pheromone matrix in place.
+
+    Equivalent to clip(pheromones * decay + deposits, lo, hi), where
+    amounts[t] is deposited along every edge of the closed tour paths[t] in
+    both directions. The deposits are first scattered onto the tour edges
+    pre-divided by decay, so a single streaming pass can then evaporate,
+    which rescales them to full strength, and apply both bounds.
+
+    pheromones must be symmetric. As in the NumPy deposit it replaced, each
+    edge is accumulated once as (min, max) in the upper triangle and the
+    touched entries are then mirrored; the element-wise pass that follows
+    keeps the matrix symmetric.
+    """
+    n = pheromones.shape[0]
+    if decay > 0.0:
+        scale = 1.0 / decay
+    else:
+        # Everything evaporates: start from zero and deposit at full strength
+        for i in prange(n):
+            for j in range(n):
+                pheromones[i, j] = 0.0
+        scale = 1.0
+        decay = 1.0
+
+    n_tours = paths.shape[0]
+    for t in range(n_tours):
+        w = amounts[t] * scale
+        for k in range(n):
+            a = paths[t, k]
+            b = paths[t, (k + 1) % n]
+            pheromones[min(a, b), max(a, b)] += w
+    for t in range(n_tours):
+        for k in range(n):
+            a = paths[t, k]
+            b = paths[t, (k + 1) % n]
+            pheromones[max(a, b), min(a, b)] = pheromones[min(a, b), max(a, b)]
+
+    for i in prange(n):
+        for j in range(n):
+            v = pheromones[i, j] * decay
+            if v < lo:
+                v = lo
+            elif v > hi:
+                v = hi
+            pheromones[i, j] = v
+
+
+@njit(parallel=True, cache=True)
+def polish_tours(paths, dists, distances, cand):
+    """Apply two_opt_cl to every tour in parallel and refresh dists in place."""
+    for t in prange(paths.shape[0]):
+        two_opt_cl(paths[t], distances, cand)
+        dists[t] = tour_length(paths[t], distances)
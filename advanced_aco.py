@@ -1,9 +1,11 @@
 import numpy as np
-import random
 import math
-from typing import List, Tuple, Dict, Optional, Callable
+import threading
+from typing import Tuple, Dict, Optional, Callable
 from enum import Enum
 
+from aco_kernels import run_iteration, run_iteration_acs, update_pheromones, set_threads
+
 class ACOVariant(Enum):
     """Different ACO algorithm variants."""
     AS = "Ant System"
@@ -11,6 +13,7 @@ class ACOVariant(Enum):
     MMAS = "Max-Min Ant System"
     RANK = "Rank-based Ant System"
 
+
 class AdvancedACO:
     """
     Advanced Ant Colony Optimization with multiple variants:
@@ -35,7 +38,10 @@ class AdvancedACO:
                  n_elite: int = 5,  # Number of elite ants
                  local_search: bool = True,
                  seed: Optional[int] = None,
-                 callback: Optional[Callable] = None):
+                 callback: Optional[Callable] = None,
+                 cl_size: int = 20,
+                 n_jobs: int = -1,
+                 stop_event: Optional[threading.Event] = None):
         """
         Initialize Advanced ACO algorithm.
 
@@ -71,10 +77,17 @@ class AdvancedACO:
             Random seed for reproducibility
         callback : Callable
             Callback function called after each iteration
+        cl_size : int
+            Candidate list length: ants choose among each city's cl_size
+            nearest neighbours and fall back to the full set once those are visited
+        n_jobs : int
+            Threads for ant construction (-1 = all cores, 1 = serial).
+            ACS always runs serially because of its local pheromone updates.
+        stop_event : threading.Event
+            When set (e.g. from another thread), solve stops before the next iteration
         """
         if seed is not None:
             np.random.seed(seed)
-            random.seed(seed)
 
         self.cities = cities
         self.n_cities = len(cities)
@@ -89,23 +102,46 @@ class AdvancedACO:
         self.n_elite = n_elite
         self.local_search = local_search
         self.callback = callback
+        self.n_jobs = n_jobs
+        self.stop_event = stop_event
 
         # Calculate distance matrix
-        self.distances = self._calculate_distances()
+        # Matrices are float32: ample precision for tour selection at half the bandwidth
+        self.distances = self._calculate_distances().astype(np.float32)
+        self.inv_distances = self.inv_distances.astype(np.float32)
+        if float(self.beta).is_integer() and 1 <= self.beta <= 4:
+            # Small integer exponents: repeated multiplication is far cheaper than pow()
+            self.eta_beta = self.inv_distances.copy()
+            for _ in range(int(self.beta) - 1):
+                self.eta_beta *= self.inv_distances
+        else:
+            self.eta_beta = np.power(self.inv_distances, np.float32(self.beta))
+
+        # Nearest-neighbour candidate lists (self excluded), one row per city
+        cl_size = max(1, min(cl_size, self.n_cities - 1))
+        self.cand = self._candidate_lists(cl_size)
 
         # Initialize pheromone matrix
         # Use a small initial value for better exploration
-        initial_pheromone = 1.0 / (self.n_cities * self._nearest_neighbor_heuristic())
-        self.pheromones = np.ones((self.n_cities, self.n_cities)) * initial_pheromone
+        self._nn_length = self._nearest_neighbor_heuristic()
+        initial_pheromone = 1.0 / (self.n_cities * self._nn_length)
+        self.pheromones = np.full((self.n_cities, self.n_cities), initial_pheromone, dtype=np.float32)
+
+        # ACS local update target, constant for the lifetime of the solver
+        self.tau0 = initial_pheromone
+
+        # Rewritten in place every iteration
+        self.choice_info = np.empty_like(self.pheromones)
+        self._update_choice_info()
 
         # MMAS pheromone bounds
         if self.variant == ACOVariant.MMAS:
             if tau_max is None:
-                tau_max = 1.0 / (evaporation_rate * self._nearest_neighbor_heuristic())
+                tau_max = 1.0 / (evaporation_rate * self._nn_length)
             if tau_min is None:
                 tau_min = tau_max / (2 * self.n_cities)
-            self.tau_min = tau_min
-            self.tau_max = tau_max
+            self.tau_min = np.float32(tau_min)
+            self.tau_max = np.float32(tau_max)
         else:
             self.tau_min = tau_min
             self.tau_max = tau_max
@@ -116,6 +152,7 @@ class AdvancedACO:
         self.iteration_best_path = None
         self.iteration_best_distance = float('inf')
         self.history = []
+        self._last_best_distance = float('inf')
         self.current_iteration = 0
 
         # Statistics
@@ -123,16 +160,23 @@ class AdvancedACO:
 
     def _calculate_distances(self) -> np.ndarray:
         """Calculate Euclidean distance matrix between all cities."""
-        distances = np.zeros((self.n_cities, self.n_cities))
-        for i in range(self.n_cities):
-            for j in range(self.n_cities):
-                if i != j:
-                    distances[i, j] = np.sqrt(
-                        (self.cities[i, 0] - self.cities[j, 0])**2 +
-                        (self.cities[i, 1] - self.cities[j, 1])**2
-                    )
+        cities = np.asarray(self.cities, dtype=float)
+        diff = cities[:, None, :] - cities[None, :, :]
+        distances = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+
+        # Heuristic visibility (1/d), zero on the diagonal and for coincident cities
+        with np.errstate(divide='ignore'):
+            self.inv_distances = np.where(distances > 0, 1.0 / distances, 0.0)
         return distances
 
+    def _candidate_lists(self, cl_size: int) -> np.ndarray:
+        """The cl_size nearest cities to each city, closest first."""
+        distances = self.distances.copy()
+        np.fill_diagonal(distances, np.inf)
+        nearest = np.argpartition(distances, cl_size - 1, axis=1)[:, :cl_size]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1)
+        return np.ascontiguousarray(np.take_along_axis(nearest, order, axis=1), dtype=np.int32)
+
     def _nearest_neighbor_heuristic(self) -> float:
         """Get approximate tour length using nearest neighbor heuristic."""
         unvisited = set(range(1, self.n_cities))
@@ -148,151 +192,56 @@ class AdvancedACO:
         distance += self.distances[current, 0]
         return distance
 
-    def _calculate_path_distance(self, path: List[int]) -> float:
-        """Calculate total distance of a path."""
-        distance = 0
-        for i in range(len(path) - 1):
-            distance += self.distances[path[i], path[i + 1]]
-        distance += self.distances[path[-1], path[0]]
-        return distance
+    def _update_choice_info(self):
+        """Recompute the tau^alpha * eta^beta table from the current pheromones."""
+        if self.alpha == 1.0:
+            # Default alpha: tau^1 needs no pow() over the whole matrix
+            np.multiply(self.pheromones, self.eta_beta, out=self.choice_info)
+        else:
+            np.power(self.pheromones, np.float32(self.alpha), out=self.choice_info)
+            self.choice_info *= self.eta_beta
 
-    def _two_opt(self, path: List[int]) -> List[int]:
+    def _evaporate_and_deposit(self, paths, amounts):
         """
-        Apply 2-opt local search to improve a path.
+        Evaporate all trails, then add amounts[t] along closed tour paths[t].
 
-        2-opt removes two edges and reconnects the path in a different way
-        to eliminate crossing edges and reduce tour length.
-        """
-        improved = True
-        best_path = path[:]
-        best_distance = self._calculate_path_distance(best_path)
-
-        while improved:
-            improved = False
-            for i in range(1, len(path) - 1):
-                for j in range(i + 1, len(path)):
-                    # Create new path by reversing the segment between i and j
-                    new_path = best_path[:i] + best_path[i:j+1][::-1] + best_path[j+1:]
-                    new_distance = self._calculate_path_distance(new_path)
-
-                    if new_distance < best_distance:
-                        best_path = new_path
-                        best_distance = new_distance
-                        improved = True
-                        break
-                if improved:
-                    break
-
-        return best_path
-
-    def _select_next_city_as(self, current_city: int, unvisited: List[int]) -> int:
-        """
-        Standard Ant System probabilistic selection.
+        MMAS bounds are applied in the same pass; other variants are unbounded.
         """
-        pheromone = np.array([self.pheromones[current_city, city] for city in unvisited])
-        heuristic = np.array([1.0 / self.distances[current_city, city]
-                             if self.distances[current_city, city] > 0 else 0
-                             for city in unvisited])
-
-        pheromone_factor = np.power(pheromone, self.alpha)
-        heuristic_factor = np.power(heuristic, self.beta)
-
-        probabilities = pheromone_factor * heuristic_factor
-        probabilities = probabilities / probabilities.sum()
-
-        next_city_idx = np.random.choice(len(unvisited), p=probabilities)
-        return unvisited[next_city_idx]
-
-    def _select_next_city_acs(self, current_city: int, unvisited: List[int]) -> int:
-        """
-        ACS pseudo-random proportional rule.
-        With probability q0, exploit best option; otherwise explore.
-        """
-        if np.random.random() < self.q0:
-            # Exploitation: choose best option
-            pheromone = np.array([self.pheromones[current_city, city] for city in unvisited])
-            heuristic = np.array([1.0 / self.distances[current_city, city]
-                                 if self.distances[current_city, city] > 0 else 0
-                                 for city in unvisited])
-
-            values = np.power(pheromone, self.alpha) * np.power(heuristic, self.beta)
-            best_idx = np.argmax(values)
-            return unvisited[best_idx]
+        paths = np.ascontiguousarray(paths, dtype=np.int32).reshape(-1, self.n_cities)
+        amounts = np.asarray(amounts, dtype=np.float64).reshape(-1)
+        if self.variant == ACOVariant.MMAS:
+            lo, hi = float(self.tau_min), float(self.tau_max)
         else:
-            # Exploration: use probabilistic rule
-            return self._select_next_city_as(current_city, unvisited)
-
-    def _local_pheromone_update_acs(self, city_i: int, city_j: int):
-        """
-        ACS local pheromone update during tour construction.
-        """
-        tau0 = 1.0 / (self.n_cities * self._nearest_neighbor_heuristic())
-        self.pheromones[city_i, city_j] = (1 - self.evaporation_rate) * self.pheromones[city_i, city_j] + \
-                                           self.evaporation_rate * tau0
-        self.pheromones[city_j, city_i] = self.pheromones[city_i, city_j]
-
-    def _construct_solution(self, ant_id: int = 0) -> List[int]:
-        """Construct a solution for one ant."""
-        start_city = random.randint(0, self.n_cities - 1)
-        path = [start_city]
-        unvisited = list(range(self.n_cities))
-        unvisited.remove(start_city)
-
-        while unvisited:
-            current_city = path[-1]
-
-            # Select next city based on variant
-            if self.variant == ACOVariant.ACS:
-                next_city = self._select_next_city_acs(current_city, unvisited)
-                # ACS local pheromone update
-                self._local_pheromone_update_acs(current_city, next_city)
-            else:
-                next_city = self._select_next_city_as(current_city, unvisited)
-
-            path.append(next_city)
-            unvisited.remove(next_city)
-
-        # Apply 2-opt local search
-        if self.local_search:
-            path = self._two_opt(path)
-
-        return path
-
-    def _update_pheromones_as(self, all_paths: List[List[int]], all_distances: List[float]):
+            lo, hi = -np.inf, np.inf
+        update_pheromones(self.pheromones, paths, amounts,
+                          1.0 - self.evaporation_rate, lo, hi)
+
+    def _construct_colony(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Build one tour per ant with the compiled kernels; returns (paths, distances)."""
+        set_threads(self.n_jobs)
+
+        if self.variant == ACOVariant.ACS:
+            # Local pheromone updates chain ACS ants together, so they run serially
+            seed = np.random.randint(0, 2**31 - 1)
+            return run_iteration_acs(self.pheromones, self.choice_info, self.eta_beta,
+                                     self.distances, self.cand, self.alpha, self.evaporation_rate,
+                                     self.tau0, self.q0, self.n_ants, seed, self.local_search)
+
+        # Per-ant seeds come from the global RNG so runs stay reproducible
+        seeds = np.random.randint(0, 2**31 - 1, size=self.n_ants)
+        return run_iteration(self.choice_info, self.distances, self.cand, seeds, self.local_search)
+
+    def _update_pheromones_as(self, all_paths: np.ndarray, all_distances: np.ndarray):
         """Standard Ant System pheromone update."""
-        # Evaporation
-        self.pheromones *= (1 - self.evaporation_rate)
-
-        # Add new pheromones from all ants
-        for path, distance in zip(all_paths, all_distances):
-            pheromone_amount = 1.0 / distance
-            for i in range(len(path) - 1):
-                self.pheromones[path[i], path[i + 1]] += pheromone_amount
-                self.pheromones[path[i + 1], path[i]] += pheromone_amount
-            self.pheromones[path[-1], path[0]] += pheromone_amount
-            self.pheromones[path[0], path[-1]] += pheromone_amount
-
-    def _update_pheromones_acs(self, all_paths: List[List[int]], all_distances: List[float]):
-        """ACS pheromone update - only best ant deposits pheromones."""
-        # Evaporation
-        self.pheromones *= (1 - self.evaporation_rate)
-
-        # Only best ant deposits pheromones
-        path = self.best_path
-        distance = self.best_distance
-        pheromone_amount = 1.0 / distance
+        # All ants deposit pheromones
+        self._evaporate_and_deposit(all_paths, 1.0 / np.asarray(all_distances))
 
-        for i in range(len(path) - 1):
-            self.pheromones[path[i], path[i + 1]] += self.evaporation_rate * pheromone_amount
-            self.pheromones[path[i + 1], path[i]] += self.evaporation_rate * pheromone_amount
-        self.pheromones[path[-1], path[0]] += self.evaporation_rate * pheromone_amount
-        self.pheromones[path[0], path[-1]] += self.evaporation_rate * pheromone_amount
+    def _update_pheromones_acs(self, all_paths: np.ndarray, all_distances: np.ndarray):
+        """ACS pheromone update - only best ant deposits pheromones."""
+        self._evaporate_and_deposit(self.best_path, self.evaporation_rate / self.best_distance)
 
-    def _update_pheromones_mmas(self, all_paths: List[List[int]], all_distances: List[float]):
+    def _update_pheromones_mmas(self, all_paths: np.ndarray, all_distances: np.ndarray):
         """MMAS pheromone update with bounds."""
-        # Evaporation
-        self.pheromones *= (1 - self.evaporation_rate)
-
         # Only iteration-best or global-best ant deposits pheromones
         # Use iteration-best for first half, global-best for second half
         if self.current_iteration < self.n_iterations // 2:
@@ -302,50 +251,22 @@ class AdvancedACO:
             path = self.best_path
             distance = self.best_distance
 
-        pheromone_amount = 1.0 / distance
-
-        for i in range(len(path) - 1):
-            self.pheromones[path[i], path[i + 1]] += pheromone_amount
-            self.pheromones[path[i + 1], path[i]] += pheromone_amount
-        self.pheromones[path[-1], path[0]] += pheromone_amount
-        self.pheromones[path[0], path[-1]] += pheromone_amount
-
-        # Apply bounds
-        self.pheromones = np.clip(self.pheromones, self.tau_min, self.tau_max)
+        # Bounds are applied in the same pass
+        self._evaporate_and_deposit(path, 1.0 / distance)
 
-    def _update_pheromones_rank(self, all_paths: List[List[int]], all_distances: List[float]):
+    def _update_pheromones_rank(self, all_paths: np.ndarray, all_distances: np.ndarray):
         """Rank-based pheromone update."""
-        # Evaporation
-        self.pheromones *= (1 - self.evaporation_rate)
-
         # Sort ants by distance (best first)
-        ranked_indices = np.argsort(all_distances)
-
-        # Elite ants deposit pheromones with decreasing weights
-        for rank, idx in enumerate(ranked_indices[:self.n_elite]):
-            path = all_paths[idx]
-            distance = all_distances[idx]
-            weight = self.n_elite - rank
-            pheromone_amount = weight / distance
-
-            for i in range(len(path) - 1):
-                self.pheromones[path[i], path[i + 1]] += pheromone_amount
-                self.pheromones[path[i + 1], path[i]] += pheromone_amount
-            self.pheromones[path[-1], path[0]] += pheromone_amount
-            self.pheromones[path[0], path[-1]] += pheromone_amount
-
-        # Best-so-far solution gets extra weight
-        path = self.best_path
-        distance = self.best_distance
-        pheromone_amount = self.elite_weight / distance
-
-        for i in range(len(path) - 1):
-            self.pheromones[path[i], path[i + 1]] += pheromone_amount
-            self.pheromones[path[i + 1], path[i]] += pheromone_amount
-        self.pheromones[path[-1], path[0]] += pheromone_amount
-        self.pheromones[path[0], path[-1]] += pheromone_amount
-
-    def _update_pheromones(self, all_paths: List[List[int]], all_distances: List[float]):
+        distances = np.asarray(all_distances)
+        elite = np.argsort(distances)[:self.n_elite]
+
+        # Elite ants deposit with decreasing weights; best-so-far gets extra weight
+        weights = self.n_elite - np.arange(len(elite))
+        paths = np.vstack([np.asarray(all_paths)[elite], self.best_path])
+        amounts = np.append(weights / distances[elite], self.elite_weight / self.best_distance)
+        self._evaporate_and_deposit(paths, amounts)
+
+    def _update_pheromones(self, all_paths: np.ndarray, all_distances: np.ndarray):
         """Update pheromones based on selected variant."""
         if self.variant == ACOVariant.AS:
             self._update_pheromones_as(all_paths, all_distances)
@@ -356,52 +277,50 @@ class AdvancedACO:
         elif self.variant == ACOVariant.RANK:
             self._update_pheromones_rank(all_paths, all_distances)
 
-    def solve(self, verbose: bool = True) -> Tuple[List[int], float]:
+    def solve(self, verbose: bool = True) -> Tuple[np.ndarray, float]:
         """
         Run the ACO algorithm to solve TSP.
 
         Returns:
         --------
-        best_path : list
-            Best path found
+        best_path : np.ndarray
+            Best path found (int32 city indices)
         best_distance : float
             Distance of best path
         """
         for iteration in range(self.n_iterations):
+            if self.stop_event is not None and self.stop_event.is_set():
+                break
             self.current_iteration = iteration
 
-            # Construct solutions for all ants
-            all_paths = []
-            all_distances = []
-
-            # Reset iteration best
-            self.iteration_best_distance = float('inf')
-            self.iteration_best_path = None
-
-            for ant in range(self.n_ants):
-                path = self._construct_solution(ant)
-                distance = self._calculate_path_distance(path)
+            # Pheromones are fixed for the rest of the iteration (bar ACS local updates)
+            self._update_choice_info()
 
-                all_paths.append(path)
-                all_distances.append(distance)
+            # Construct solutions for all ants
+            all_paths, all_distances = self._construct_colony()
 
-                # Update iteration best
-                if distance < self.iteration_best_distance:
-                    self.iteration_best_distance = distance
-                    self.iteration_best_path = path
+            # Update iteration best
+            best_ant = int(np.argmin(all_distances))
+            self.iteration_best_distance = float(all_distances[best_ant])
+            self.iteration_best_path = all_paths[best_ant]
 
-                # Update global best
-                if distance < self.best_distance:
-                    self.best_distance = distance
-                    self.best_path = path
+            # Update global best
+            if self.iteration_best_distance < self.best_distance:
+                self.best_distance = self.iteration_best_distance
+                self.best_path = self.iteration_best_path.copy()
 
             # Update pheromones
             self._update_pheromones(all_paths, all_distances)
 
             # Track progress
             avg_distance = np.mean(all_distances)
-            min_pheromone = np.min(self.pheromones[self.pheromones > 0])
-            max_pheromone = np.max(self.pheromones)
+            min_pheromone = float(self.pheromones.min())
+            max_pheromone = float(self.pheromones.max())
+
+            # Only record the best path when it changed; consumers forward-fill.
+            # best_path is replaced, never mutated, so the entry can share it.
+            improved = self.best_distance < self._last_best_distance
+            self._last_best_distance = self.best_distance
 
             iteration_data = {
                 'iteration': iteration,
@@ -410,7 +329,7 @@ class AdvancedACO:
                 'avg_distance': avg_distance,
                 'min_pheromone': min_pheromone,
                 'max_pheromone': max_pheromone,
-                'best_path': self.best_path.copy() if self.best_path else None
+                'best_path': self.best_path if improved else None
             }
             self.history.append(iteration_data)
 
@@ -3,34 +3,72 @@ from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 import numpy as np
 import json
+import base64
+import orjson
 from advanced_aco import AdvancedACO, ACOVariant, generate_random_cities
+from aco_kernels import set_threads
 import threading
-import time
+
+
+class OrjsonSerializer:
+    """
+    JSON module for Socket.IO packets backed by orjson.
+
+    Serializes numpy arrays and scalars natively, so payloads can be
+    emitted without first converting them to Python lists and floats.
+    """
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'aco-visualization-secret'
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', json=OrjsonSerializer)
 
 # Global state
 current_aco = None
 is_running = False
-stop_requested = False
+# Guards the is_running check-and-set so only one solver (and so one thread
+# inside the parallel Numba kernels) runs at a time
+run_lock = threading.Lock()
+
+# Start the Numba thread pool from the main thread; launching it first from
+# a solver thread can hang the process at exit
+set_threads(-1)
+
+# Strongest pheromone edges streamed to the client each iteration
+PHEROMONE_TOP_K = 500
 
 
-def numpy_to_json(obj):
-    """Convert numpy types to JSON-serializable types."""
-    if isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {key: numpy_to_json(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [numpy_to_json(item) for item in obj]
-    return obj
+def pheromone_payload(pheromones, upper, k=PHEROMONE_TOP_K):
+    """
+    Sparse view of the strongest k pheromone edges.
+
+    The matrix is symmetric, so only the upper triangle (pre-computed
+    indices in upper) is considered. Values are sent as base64-encoded
+    float32 bytes, which is far smaller than a JSON list of numbers.
+    """
+    values = pheromones[upper]
+    k = min(k, values.size)
+    idx = np.argpartition(values, values.size - k)[values.size - k:] if k else np.arange(0)
+    return {
+        'i': upper[0][idx].tolist(),
+        'j': upper[1][idx].tolist(),
+        'v': base64.b64encode(values[idx].astype(np.float32).tobytes()).decode('ascii')
+    }
+
+
+def request_stop():
+    """Ask the running solver, if any, to stop before its next iteration."""
+    if current_aco is not None and current_aco.stop_event is not None:
+        current_aco.stop_event.set()
 
 
 @app.route('/')
@@ -65,9 +103,8 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection."""
-    global stop_requested
     print('Client disconnected')
-    stop_requested = True
+    request_stop()
 
 
 @socketio.on('test_connection')
@@ -80,14 +117,17 @@ def handle_test_connection(data):
 @socketio.on('start_aco')
 def handle_start_aco(data):
     """Start ACO algorithm with given parameters."""
-    global current_aco, is_running, stop_requested
+    global current_aco, is_running
 
     print(f"[DEBUG] Received start_aco event with data keys: {data.keys()}")
     print(f"[DEBUG] Cities data: {data.get('cities', 'NOT FOUND')[:3] if 'cities' in data else 'NO CITIES'}")
 
-    if is_running:
-        emit('error', {'message': 'Algorithm is already running'})
-        return
+    # Claim the run before building the solver, so two clients cannot both start one
+    with run_lock:
+        if is_running:
+            emit('error', {'message': 'Algorithm is already running'})
+            return
+        is_running = True
 
     try:
         # Parse parameters
@@ -101,6 +141,9 @@ def handle_start_aco(data):
         evaporation_rate = data.get('evaporation_rate', 0.1)
         q0 = data.get('q0', 0.9)
         local_search = data.get('local_search', True)
+        # Emit every k-th iteration (plus improvements and the last one); the
+        # default keeps long runs to roughly 200 updates
+        emit_every = max(1, int(data.get('emit_every', n_iterations // 200)))
 
         # Map variant name to enum
         variant_map = {
@@ -111,19 +154,33 @@ def handle_start_aco(data):
         }
         variant = variant_map.get(variant_name, ACOVariant.MMAS)
 
+        # Upper-triangle indices, reused for every pheromone payload
+        upper = np.triu_indices(len(cities), k=1)
+
+        # Set by stop_aco/disconnect; the solver checks it every iteration
+        stop_event = threading.Event()
+
+        # Best distance the client last saw
+        last_sent_best = [float('inf')]
+
         # Create callback for real-time updates
         def iteration_callback(iteration_data):
-            if stop_requested:
+            if stop_event.is_set():
+                return
+
+            iteration = iteration_data['iteration']
+            improved = iteration_data['best_distance'] < last_sent_best[0]
+            if not (improved or iteration % emit_every == 0 or iteration == n_iterations - 1):
                 return
+            last_sent_best[0] = iteration_data['best_distance']
 
-            # Convert numpy types to JSON-serializable
-            data_to_send = numpy_to_json(iteration_data)
+            # Copy so the payload-only fields stay out of the solver history
+            data_to_send = dict(iteration_data)
 
-            # Add pheromone matrix for visualization
-            data_to_send['pheromones'] = numpy_to_json(current_aco.pheromones)
+            # Add the strongest pheromone edges for visualization
+            data_to_send['pheromones'] = pheromone_payload(current_aco.pheromones, upper)
 
             socketio.emit('iteration_update', data_to_send)
-            time.sleep(0.01)  # Small delay for visualization
 
         # Create ACO instance
         current_aco = AdvancedACO(
@@ -136,24 +193,23 @@ def handle_start_aco(data):
             evaporation_rate=evaporation_rate,
             q0=q0,
             local_search=local_search,
-            callback=iteration_callback
+            callback=iteration_callback,
+            stop_event=stop_event
         )
 
         # Run algorithm in separate thread
         def run_algorithm():
-            global is_running, stop_requested
-            is_running = True
-            stop_requested = False
+            global is_running
 
             try:
                 socketio.emit('algorithm_started', {'message': 'Algorithm started'})
                 best_path, best_distance = current_aco.solve(verbose=False)
 
-                if not stop_requested:
+                if not stop_event.is_set():
                     result = {
-                        'best_path': numpy_to_json(best_path),
+                        'best_path': best_path,
                         'best_distance': float(best_distance),
-                        'statistics': numpy_to_json(current_aco.get_statistics())
+                        'statistics': current_aco.get_statistics()
                     }
                     socketio.emit('algorithm_complete', result)
             except Exception as e:
@@ -176,8 +232,7 @@ def handle_start_aco(data):
 @socketio.on('stop_aco')
 def handle_stop_aco():
     """Stop the running algorithm."""
-    global stop_requested
-    stop_requested = True
+    request_stop()
     emit('algorithm_stopped', {'message': 'Algorithm stopped'})
 
 
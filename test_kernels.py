@@ -0,0 +1,169 @@
+"""Quick test of the compiled ACO kernels."""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+from advanced_aco import AdvancedACO, ACOVariant, generate_random_cities
+from tsp_aco import AntColonyTSP
+from aco_kernels import (run_iteration, run_iteration_acs, two_opt_nb, two_opt_cl,
+                         tour_length, update_pheromones, _roulette)
+
+print("=" * 70)
+print("TESTING ACO KERNELS")
+print("=" * 70)
+print()
+
+cities = generate_random_cities(n_cities=30, seed=7)
+aco = AdvancedACO(cities=cities, variant=ACOVariant.AS, seed=7)
+n = aco.n_cities
+
+# Inverse-CDF roulette: evenly spaced draws split in proportion to the weights,
+# never picking visited or zero-weight cities
+print("Checking roulette sampling...")
+row = np.array([0.0, 1.0, 2.0, 0.0, 3.0, 4.0])
+cands = np.arange(6, dtype=np.int32)
+visited = np.zeros(6, dtype=np.bool_)
+visited[5] = True
+cum = np.empty(6)
+draws = [_roulette(row, cands, visited, u, cum) for u in (np.arange(6000) + 0.5) / 6000]
+assert np.array_equal(np.bincount(draws, minlength=6), [0, 1000, 2000, 0, 3000, 0])
+visited[:] = True
+assert _roulette(row, cands, visited, 0.5, cum) == -1
+print("[PASS] _roulette samples in proportion to unnormalised weights")
+
+# Every ant must return a valid permutation with a matching length
+print("Running parallel construction kernel...")
+seeds = np.arange(16)
+paths, dists = run_iteration(aco.choice_info, aco.distances, aco.cand, seeds, False)
+for path, dist in zip(paths, dists):
+    assert sorted(path.tolist()) == list(range(n))
+    assert np.isclose(dist, tour_length(path, aco.distances))
+
+# Same seeds must give the same tours
+paths_again, _ = run_iteration(aco.choice_info, aco.distances, aco.cand, seeds, False)
+assert np.array_equal(paths, paths_again)
+print("[PASS] run_iteration builds reproducible valid tours")
+
+# Short candidate lists force the fallback to the rest of the roster
+short = AdvancedACO(cities=cities, variant=ACOVariant.AS, cl_size=3, seed=7)
+assert short.cand.shape == (n, 3)
+assert np.all(short.cand != np.arange(n)[:, None])
+paths_short, _ = run_iteration(short.choice_info, short.distances, short.cand, seeds, False)
+for path in paths_short:
+    assert sorted(path.tolist()) == list(range(n))
+print("[PASS] run_iteration falls back once candidate lists are exhausted")
+
+# Full-roster lists (AntColonyTSP) sample every unvisited city directly
+basic = AntColonyTSP(cities=cities, cl_size=n, seed=7)
+assert basic.cand.shape == (n, n - 1)
+for matrix in (basic.distances, basic.eta_beta, basic.pheromones, basic.choice_info):
+    assert matrix.dtype == np.float32 and matrix.flags.c_contiguous
+paths_full, dists_full = run_iteration(basic.choice_info, basic.distances, basic.cand, seeds, False)
+for path, dist in zip(paths_full, dists_full):
+    assert sorted(path.tolist()) == list(range(n))
+    assert np.isclose(dist, basic._calculate_path_distance(path))
+print("[PASS] run_iteration builds AntColonyTSP tours over the full roster")
+
+# 2-opt never makes a tour longer
+print("Running 2-opt kernel...")
+for path in paths:
+    before = tour_length(path, aco.distances)
+    improved = two_opt_nb(path.copy(), aco.distances)
+    assert sorted(improved.tolist()) == list(range(n))
+    assert tour_length(improved, aco.distances) <= before + 1e-9
+print("[PASS] two_opt_nb only shortens tours")
+
+# Candidate-list 2-opt: same guarantees, and with full lists no 2-opt move is left
+for path in paths:
+    before = tour_length(path, aco.distances)
+    improved = two_opt_cl(path.copy(), aco.distances, aco.cand)
+    assert sorted(improved.tolist()) == list(range(n))
+    assert tour_length(improved, aco.distances) <= before + 1e-9
+full = two_opt_cl(paths[0].copy(), basic.distances, basic.cand)
+while True:
+    length = tour_length(full, basic.distances)
+    if tour_length(two_opt_cl(full, basic.distances, basic.cand), basic.distances) >= length - 1e-9:
+        break
+assert np.isclose(tour_length(two_opt_nb(full.copy(), basic.distances), basic.distances), length)
+print("[PASS] two_opt_cl only shortens tours and converges to a 2-opt optimum")
+
+# ACS kernel keeps pheromones symmetric while updating them locally
+print("Running ACS kernel...")
+acs = AdvancedACO(cities=cities, variant=ACOVariant.ACS, seed=7)
+paths, dists = run_iteration_acs(acs.pheromones, acs.choice_info, acs.eta_beta,
+                                 acs.distances, acs.cand, acs.alpha, acs.evaporation_rate,
+                                 acs.tau0, acs.q0, 10, 7, True)
+for path in paths:
+    assert sorted(path.tolist()) == list(range(n))
+assert np.allclose(acs.pheromones, acs.pheromones.T)
+print("[PASS] run_iteration_acs builds valid tours")
+
+# Fused pheromone update matches evaporate -> deposit -> clip done in NumPy
+print("Running pheromone update kernel...")
+
+
+def reference_update(pheromones, paths, amounts, decay, lo, hi):
+    result = pheromones * decay
+    for path, amount in zip(paths, amounts):
+        nxt = np.roll(path, -1)
+        np.add.at(result, (path, nxt), amount)
+        np.add.at(result, (nxt, path), amount)
+    return np.clip(result, lo, hi)
+
+
+# An MMAS edge that decays below tau_min and then receives a deposit
+tau = np.ones((5, 5), dtype=np.float32)
+tour = np.arange(5, dtype=np.int32)[None, :]
+expected = reference_update(tau, tour, [0.05], 0.5, 0.8, 2.0)
+update_pheromones(tau, tour, np.array([0.05]), 0.5, 0.8, 2.0)
+assert np.allclose(tau, expected) and np.isclose(tau[0, 1], 0.8)
+
+rng = np.random.default_rng(3)
+start = rng.uniform(0.01, 1.0, (n, n)).astype(np.float32)
+start = (start + start.T) / 2
+tours = np.array([rng.permutation(n) for _ in range(6)], dtype=np.int32)
+tours[1] = tours[0]  # repeated edges accumulate
+amounts = rng.uniform(0.01, 0.5, len(tours))
+for decay, lo, hi in ((0.9, -np.inf, np.inf), (0.5, 0.3, 0.8), (0.98, 0.2, 1.1), (0.0, 0.05, 0.6)):
+    tau = start.copy()
+    update_pheromones(tau, tours, amounts, decay, lo, hi)
+    assert np.allclose(tau, reference_update(start, tours, amounts, decay, lo, hi), rtol=1e-5)
+    assert np.array_equal(tau, tau.T)
+print("[PASS] update_pheromones matches the NumPy reference, MMAS bounds included")
+
+# A serial solver must not leave later default solvers on one thread
+thread_check = ("import numba\n"
+                "from aco_kernels import set_threads\n"
+                "set_threads(1)\n"
+                "assert numba.get_num_threads() == 1\n"
+                "set_threads(-1)\n"
+                "assert numba.get_num_threads() == 4")
+result = subprocess.run([sys.executable, '-c', thread_check],
+                        cwd=os.path.dirname(os.path.abspath(__file__)),
+                        env=dict(os.environ, NUMBA_NUM_THREADS='4'),
+                        capture_output=True, text=True)
+assert result.returncode == 0, result.stderr
+print("[PASS] set_threads restores all threads after a serial run")
+
+# Cached kernels must load cleanly in fresh processes once both solvers have
+# populated the on-disk cache (a cached njit caller of the parallel kernel
+# used to segfault here)
+print("Running both solvers against a warm kernel cache...")
+solvers = {
+    'basic': "from tsp_aco import AntColonyTSP, generate_random_cities\n"
+             "AntColonyTSP(generate_random_cities(15, seed=1), n_iterations=3, seed=1).solve(False)",
+    'advanced': "from advanced_aco import AdvancedACO, ACOVariant, generate_random_cities\n"
+                "AdvancedACO(generate_random_cities(15, seed=1), variant=ACOVariant.MMAS,\n"
+                "            n_iterations=3, seed=1).solve(False)",
+}
+here = os.path.dirname(os.path.abspath(__file__))
+for name in ('basic', 'advanced', 'advanced', 'basic'):
+    result = subprocess.run([sys.executable, '-c', solvers[name]], cwd=here,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, f"{name} solver failed ({result.returncode}): {result.stderr}"
+print("[PASS] Both solvers run in separate processes with a warm cache")
+
+print()
+print("[PASS] All kernel tests passed!")
@@ -1,9 +1,8 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-import random
 import math
 
+from aco_kernels import construct_colony, two_opt_cl, polish_tours, set_threads
+
 class AntColonyTSP:
     """
     Ant Colony Optimization for solving the Traveling Salesman Problem.
@@ -16,7 +15,8 @@ class AntColonyTSP:
     """
     
     def __init__(self, cities, n_ants=20, n_iterations=100, alpha=1.0, beta=2.0, 
-                 evaporation_rate=0.5, pheromone_deposit=1.0, seed=None):
+                 evaporation_rate=0.5, pheromone_deposit=1.0, seed=None, n_jobs=-1,
+                 local_search='best', cl_size=20, n_elite=None, elite_weight=None):
         """
         Initialize ACO algorithm.
         
@@ -38,10 +38,23 @@ class AntColonyTSP:
             Amount of pheromone deposited by ants
         seed : int
             Random seed for reproducibility
+        n_jobs : int
+            Threads used to build the ants of an iteration (-1 = all cores)
+        local_search : str or None
+            2-opt polish applied each iteration: 'best' (iteration-best ant
+            only), 'all' (every ant) or None
+        cl_size : int
+            Candidate list length: ants and 2-opt only consider each city's
+            cl_size nearest neighbours (ants fall back to the full roster
+            once these are all visited)
+        n_elite : int
+            Iteration-best ants that deposit pheromone (default n_ants // 5, at least 1)
+        elite_weight : float
+            Extra deposit on the best-so-far tour, in units of pheromone_deposit
+            (default n_elite)
         """
-        if seed is not None:
-            np.random.seed(seed)
-            random.seed(seed)
+        # Per-instance generator: seeds the compiled ants without touching global state
+        self.rng = np.random.default_rng(seed)
         
         self.cities = cities
         self.n_cities = len(cities)
@@ -51,91 +64,149 @@ class AntColonyTSP:
         self.beta = beta    # Distance influence
         self.evaporation_rate = evaporation_rate
         self.pheromone_deposit = pheromone_deposit
+        self.n_jobs = n_jobs
+        self.local_search = local_search
+        self.n_elite = n_elite if n_elite is not None else max(1, n_ants // 5)
+        self.elite_weight = elite_weight if elite_weight is not None else self.n_elite
         
         # Calculate distance matrix
-        self.distances = self._calculate_distances()
+        # float32, C-ordered; eta_beta, pheromones and choice_info inherit both.
+        # With a small tau0 and rho=0.5, unreinforced choice_info entries
+        # underflow to exactly 0.0 within ~100 iterations. The roulette skips
+        # zero weights, and an ant whose candidates are all zero or visited
+        # takes the best remaining city by choice_info instead
+        self.distances = np.ascontiguousarray(self._calculate_distances(), dtype=np.float32)
+        
+        # Heuristic: inverse of distance (closer cities are more attractive),
+        # raised to beta once here rather than per step. The inf diagonal
+        # makes 1/d zero there without a branch
+        with np.errstate(divide='ignore'):
+            self.inv_distances = np.float32(1.0) / self.distances
+        # Coincident cities (d = 0 off the diagonal) get no heuristic weight
+        self.inv_distances[np.isinf(self.inv_distances)] = 0.0
+        self.eta_beta = np.power(self.inv_distances, np.float32(self.beta))
+        
+        # Nearest-neighbour candidate lists, closest first
+        cl_size = max(1, min(cl_size, self.n_cities - 1))
+        self.cand = self._neighbor_lists()[:, :cl_size].copy()
         
-        # Initialize pheromone matrix
-        self.pheromones = np.ones((self.n_cities, self.n_cities)) * 0.1
+        # Initialize pheromone matrix at Dorigo's tau0 = 1 / (n * L_nn), with
+        # the nearest-neighbour tour's edges doubled so early ants start near it
+        nn_path, nn_length = self._nearest_neighbor_tour()
+        tau0 = 1.0 / (self.n_cities * nn_length)
+        self.pheromones = np.full((self.n_cities, self.n_cities), tau0, dtype=np.float32)
+        nn_next = np.roll(nn_path, -1)
+        self.pheromones[nn_path, nn_next] += tau0
+        self.pheromones[nn_next, nn_path] += tau0
+        
+        # tau^alpha * eta^beta, computed once here and then kept in step
+        # with the pheromones by _update_pheromones
+        self.choice_info = np.power(self.pheromones, np.float32(self.alpha)) * self.eta_beta
         
         # Best solution tracking
         self.best_path = None
         self.best_distance = float('inf')
-        self.history = []
+        
+        # Per-iteration results, written in place by solve
+        self.all_paths = np.empty((n_iterations, n_ants, self.n_cities), dtype=np.int32)
+        self.all_dist = np.empty((n_iterations, n_ants))
+        self.hist_best = np.empty(n_iterations)
+        self.hist_avg = np.empty(n_iterations)
+        self.n_completed = 0
         
     def _calculate_distances(self):
-        """Calculate Euclidean distance matrix between all cities."""
-        distances = np.zeros((self.n_cities, self.n_cities))
-        for i in range(self.n_cities):
-            for j in range(self.n_cities):
-                if i != j:
-                    distances[i, j] = np.sqrt(
-                        (self.cities[i, 0] - self.cities[j, 0])**2 + 
-                        (self.cities[i, 1] - self.cities[j, 1])**2
-                    )
+        """
+        Calculate Euclidean distance matrix between all cities.
+        The diagonal is inf: no tour uses it, and 1/d is then zero there.
+        """
+        cities = np.asarray(self.cities, dtype=float)
+        diff = cities[:, None, :] - cities[None, :, :]
+        distances = np.sqrt((diff * diff).sum(-1))
+        np.fill_diagonal(distances, np.inf)
         return distances
     
     def _calculate_path_distance(self, path):
-        """Calculate total distance of a path."""
-        distance = 0
-        for i in range(len(path) - 1):
-            distance += self.distances[path[i], path[i + 1]]
-        # Add distance back to start
-        distance += self.distances[path[-1], path[0]]
-        return distance
+        """Calculate total distance of a path (closed tour, all n edges)."""
+        path = np.asarray(path)
+        return float(self.distances[path, np.roll(path, -1)].sum(dtype=np.float64))
     
-    def _select_next_city(self, current_city, unvisited):
-        """
-        Select next city based on pheromone levels and distances.
-        Uses probabilistic decision rule combining pheromones and heuristic information.
+    def _nearest_neighbor_tour(self):
+        """Greedy nearest-neighbour tour from city 0; returns (path, length)."""
+        path = np.empty(self.n_cities, dtype=np.int32)
+        unvisited = np.ones(self.n_cities, dtype=bool)
+        path[0] = 0
+        unvisited[0] = False
+        for step in range(1, self.n_cities):
+            row = np.where(unvisited, self.distances[path[step - 1]], np.inf)
+            path[step] = np.argmin(row)
+            unvisited[path[step]] = False
+        return path, self._calculate_path_distance(path)
+    
+    def _neighbor_lists(self):
+        """For each city, all other cities ordered by distance (int32)."""
+        # The inf diagonal sorts each city itself last
+        return np.ascontiguousarray(np.argsort(self.distances, axis=1)[:, :-1], dtype=np.int32)
+    
+    @property
+    def history(self):
+        """Per-iteration best/average distances of the last solve, as dicts."""
+        return [{'iteration': i,
+                 'best_distance': float(self.hist_best[i]),
+                 'avg_distance': float(self.hist_avg[i])}
+                for i in range(self.n_completed)]
+    
+    def _construct_colony(self, iteration):
         """
-        pheromone = np.array([self.pheromones[current_city, city] for city in unvisited])
-        # Heuristic: inverse of distance (closer cities are more attractive)
-        heuristic = np.array([1.0 / self.distances[current_city, city] if self.distances[current_city, city] > 0 else 0 
-                             for city in unvisited])
+        Build one tour per ant in parallel into the buffers of iteration;
+        returns (paths, distances) views of them.
         
-        # Calculate probabilities
-        pheromone_factor = np.power(pheromone, self.alpha)
-        heuristic_factor = np.power(heuristic, self.beta)
+        Ants within an iteration are independent, so the compiled kernel
+        spreads them over Numba threads. Each ant gets its own seed from
+        self.rng, keeping runs reproducible for a fixed seed.
+        """
+        set_threads(self.n_jobs)
+        seeds = self.rng.integers(0, 2**31 - 1, size=self.n_ants)
+        paths = self.all_paths[iteration]
+        dists = self.all_dist[iteration]
+        construct_colony(self.choice_info, self.distances, self.cand, seeds, False, paths, dists)
+        if self.local_search == 'all':
+            polish_tours(paths, dists, self.distances, self.cand)
+        return paths, dists
+    
+    def _update_pheromones(self, all_paths, all_distances):
+        """
+        Elitist pheromone update.
         
-        probabilities = pheromone_factor * heuristic_factor
-        probabilities = probabilities / probabilities.sum()
+        Only the n_elite shortest tours of the iteration deposit, plus the
+        best-so-far tour with a bonus of elite_weight * pheromone_deposit,
+        so mediocre tours no longer dilute the trail.
+        """
+        distances = np.asarray(all_distances)
+        elite = np.argsort(distances)[:self.n_elite]
+        paths = np.vstack([np.asarray(all_paths)[elite], self.best_path])
+        nxt = np.roll(paths, -1, axis=1)  # successor of each city, closing each tour
         
-        # Select city based on probabilities
-        next_city_idx = np.random.choice(len(unvisited), p=probabilities)
-        return unvisited[next_city_idx]
-    
-    def _construct_solution(self):
-        """Construct a solution for one ant."""
-        # Start from a random city
-        start_city = random.randint(0, self.n_cities - 1)
-        path = [start_city]
-        unvisited = list(range(self.n_cities))
-        unvisited.remove(start_city)
+        # Every edge of a tour gets deposit / tour length
+        amounts = self.pheromone_deposit * np.append(1.0 / distances[elite],
+                                                     self.elite_weight / self.best_distance)
+        amounts = np.broadcast_to(amounts[:, None], paths.shape)
         
-        # Build path by selecting cities one by one
-        while unvisited:
-            current_city = path[-1]
-            next_city = self._select_next_city(current_city, unvisited)
-            path.append(next_city)
-            unvisited.remove(next_city)
+        # Scatter all deposits at once; add.at accumulates repeated edges
+        deltas = np.zeros_like(self.pheromones)
+        np.add.at(deltas, (paths.ravel(), nxt.ravel()), amounts.ravel())
+        deltas += deltas.T
         
-        return path
-    
-    def _update_pheromones(self, all_paths, all_distances):
-        """Update pheromone levels based on ant solutions."""
-        # Evaporation
+        # Evaporation plus new pheromones
         self.pheromones *= (1 - self.evaporation_rate)
+        self.pheromones += deltas
         
-        # Add new pheromones
-        for path, distance in zip(all_paths, all_distances):
-            pheromone_amount = self.pheromone_deposit / distance
-            for i in range(len(path) - 1):
-                self.pheromones[path[i], path[i + 1]] += pheromone_amount
-                self.pheromones[path[i + 1], path[i]] += pheromone_amount
-            # Add pheromone for return to start
-            self.pheromones[path[-1], path[0]] += pheromone_amount
-            self.pheromones[path[0], path[-1]] += pheromone_amount
+        # Evaporation scales every tau^alpha by (1 - rho)^alpha, so choice_info
+        # only needs recomputing on the deposited edges
+        self.choice_info *= np.float32((1 - self.evaporation_rate) ** self.alpha)
+        edges = (np.concatenate([paths.ravel(), nxt.ravel()]),
+                 np.concatenate([nxt.ravel(), paths.ravel()]))
+        self.choice_info[edges] = (np.power(self.pheromones[edges], np.float32(self.alpha))
+                                   * self.eta_beta[edges])
     
     def solve(self, verbose=True):
         """
@@ -143,38 +214,35 @@ class AntColonyTSP:
         
         Returns:
         --------
-        best_path : list
-            Best path found
+        best_path : np.ndarray
+            Best path found (int32 city indices)
         best_distance : float
             Distance of best path
         """
+        self.n_completed = 0
         for iteration in range(self.n_iterations):
             # Construct solutions for all ants
-            all_paths = []
-            all_distances = []
+            all_paths, all_distances = self._construct_colony(iteration)
             
-            for ant in range(self.n_ants):
-                path = self._construct_solution()
-                distance = self._calculate_path_distance(path)
-                
-                all_paths.append(path)
-                all_distances.append(distance)
-                
-                # Update best solution
-                if distance < self.best_distance:
-                    self.best_distance = distance
-                    self.best_path = path
+            best_ant = int(np.argmin(all_distances))
+            if self.local_search == 'best':
+                # Polish the iteration-best tour before it deposits pheromone
+                two_opt_cl(all_paths[best_ant], self.distances, self.cand)
+                all_distances[best_ant] = self._calculate_path_distance(all_paths[best_ant])
+            
+            # Update best solution
+            if all_distances[best_ant] < self.best_distance:
+                self.best_distance = float(all_distances[best_ant])
+                self.best_path = all_paths[best_ant].copy()
             
             # Update pheromones
             self._update_pheromones(all_paths, all_distances)
             
             # Track progress
-            avg_distance = np.mean(all_distances)
-            self.history.append({
-                'iteration': iteration,
-                'best_distance': self.best_distance,
-                'avg_distance': avg_distance
-            })
+            avg_distance = float(self.all_dist[iteration].mean())
+            self.hist_best[iteration] = self.best_distance
+            self.hist_avg[iteration] = avg_distance
+            self.n_completed = iteration + 1
             
             if verbose and (iteration % 10 == 0 or iteration == self.n_iterations - 1):
                 print(f"Iteration {iteration}: Best = {self.best_distance:.2f}, Avg = {avg_distance:.2f}")
@@ -183,11 +251,14 @@ class AntColonyTSP:
     
     def plot_solution(self, save_path=None):
         """Plot the best solution found."""
+        # Imported here so solving never pays for loading matplotlib
+        import matplotlib.pyplot as plt
+        
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
         
         # Plot the tour
         if self.best_path is not None:
-            path_cities = self.cities[self.best_path + [self.best_path[0]]]
+            path_cities = self.cities[np.append(self.best_path, self.best_path[0])]
             ax1.plot(path_cities[:, 0], path_cities[:, 1], 'b-', linewidth=2, alpha=0.7)
             ax1.scatter(self.cities[:, 0], self.cities[:, 1], c='red', s=100, zorder=5)
             
@@ -207,10 +278,10 @@ class AntColonyTSP:
             ax1.grid(True, alpha=0.3)
         
         # Plot convergence
-        if self.history:
-            iterations = [h['iteration'] for h in self.history]
-            best_distances = [h['best_distance'] for h in self.history]
-            avg_distances = [h['avg_distance'] for h in self.history]
+        if self.n_completed:
+            iterations = np.arange(self.n_completed)
+            best_distances = self.hist_best[:self.n_completed]
+            avg_distances = self.hist_avg[:self.n_completed]
             
             ax2.plot(iterations, best_distances, 'g-', linewidth=2, label='Best Distance')
             ax2.plot(iterations, avg_distances, 'b--', alpha=0.7, label='Average Distance')